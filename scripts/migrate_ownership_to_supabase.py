@@ -3,121 +3,108 @@ Migrate transformed ownership data to Supabase
 Run this after transforming the data with transform_ownership_data.py
 """
 
+import argparse
+import asyncio
 import json
 import os
+import time
 from pathlib import Path
-from supabase import create_client, Client
+import httpx
+from supabase import acreate_client, AsyncClient, AsyncClientOptions
+from tqdm import tqdm
 from dotenv import load_dotenv
 
 # Load environment variables from .env.local in project root
 env_path = Path(__file__).parent.parent / '.env.local'
 load_dotenv(env_path)
 
-def migrate_ownership_data(json_path='../data/ownership_transformed.json'):
+# Rows per insert/upsert request (PostgREST accepts JSON arrays)
+BATCH_SIZE = 500
+
+# Max portfolio batches in flight at once (small values work best for bulk inserts)
+MAX_CONCURRENT_BATCHES = 8
+
+# Connection pool limits for the shared HTTP client (comfortably above MAX_CONCURRENT_BATCHES)
+HTTP_MAX_CONNECTIONS = 32
+HTTP_TIMEOUT_S = 60.0
+
+HOLDER_COLUMNS = [
+    'holder_name', 'ticker', 'total_position', 'total_percent_out', 'latest_change',
+    'institution_type', 'country', 'metro_area', 'insider_status', 'tree_level'
+]
+PORTFOLIO_COLUMNS = [
+    'holder_id', 'portfolio_name', 'position', 'percent_out', 'percent_portfolio',
+    'latest_change', 'filing_date', 'source', 'tree_level'
+]
+
+def chunked(rows, size=BATCH_SIZE):
+    """Yield successive slices of at most `size` rows"""
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+DEFAULT_JSON_PATH = '../data/ownership_transformed.json'
+
+def load_transformed_data(data=None, json_path=None):
     """
-    Migrate ownership data from JSON to Supabase
+    Return `data` as-is, or load it from json_path when not given
     """
-    print("=" * 80)
-    print("MIGRATING OWNERSHIP DATA TO SUPABASE")
-    print("=" * 80)
-    
-    # Initialize Supabase client
-    # Use service role key for migrations to bypass RLS
-    supabase_url = os.getenv('NEXT_PUBLIC_SUPABASE_URL')
-    supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('NEXT_PUBLIC_SUPABASE_ANON_KEY')
-    
-    if not supabase_url or not supabase_key:
-        print("ERROR: Supabase credentials not found in environment variables")
-        print("Please set NEXT_PUBLIC_SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY (or NEXT_PUBLIC_SUPABASE_ANON_KEY)")
-        return
-    
-    if 'SERVICE_ROLE' in supabase_key or len(supabase_key) > 100:
-        print("Using service role key (bypasses RLS)")
+    if data is None:
+        json_path = json_path or DEFAULT_JSON_PATH
+        print(f"\n1. Loading transformed data from {json_path}...")
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
     else:
-        print("WARNING: Using anon key - RLS policies may block inserts")
-    
-    supabase: Client = create_client(supabase_url, supabase_key)
-    
-    # Load transformed data
-    print("\n1. Loading transformed data...")
-    with open(json_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    holders = data['holders']
-    portfolios = data['portfolios']
-    
-    print(f"   Found {len(holders)} holders and {len(portfolios)} portfolios")
-    
-    # Insert holders
-    print("\n2. Inserting holders...")
-    holder_id_map = {}  # Map holder_name to database ID
+        print("\n1. Using in-memory transformed data...")
+    return data
+
+def prepare_holder_rows(holders):
+    """
+    Shape transformed holders into ownership_holders rows
+    """
+    holder_rows = []
     
     for holder in holders:
-        try:
-            # Prepare holder data - only include fields that exist in the schema
-            # Cap total_percent_out at 100% (no holder can own more than 100% of a company)
-            total_percent_out = float(holder['total_percent_out'])
-            if total_percent_out > 100:
-                print(f"   ⚠ Capping total_percent_out for {holder['holder_name']}: {total_percent_out}% -> 100%")
-                total_percent_out = 100
-            
-            holder_data = {
-                'holder_name': holder['holder_name'],
-                'ticker': holder['ticker'],
-                'total_position': holder['total_position'],
-                'total_percent_out': round(total_percent_out, 2),
-                'latest_change': holder['latest_change'],
-                'institution_type': holder.get('institution_type'),
-                'country': holder.get('country'),
-                'metro_area': holder.get('metro_area'),
-                'insider_status': holder.get('insider_status'),
-                'tree_level': holder.get('tree_level', 0)
-            }
-            
-            # Check if holder already exists
-            existing = supabase.table('ownership_holders').select('id, holder_name').eq('holder_name', holder['holder_name']).eq('ticker', holder['ticker']).execute()
-            
-            if existing.data:
-                holder_id = existing.data[0]['id']
-                # Update existing holder
-                supabase.table('ownership_holders').update(holder_data).eq('id', holder_id).execute()
-            else:
-                # Insert new holder
-                result = supabase.table('ownership_holders').insert(holder_data).execute()
-                holder_id = result.data[0]['id']
-            
-            holder_id_map[holder['holder_name']] = holder_id
-            print(f"   ✓ {holder['holder_name']}")
-        except Exception as e:
-            print(f"   ✗ Error inserting {holder['holder_name']}: {str(e)}")
+        # Prepare holder data - only include fields that exist in the schema
+        # Cap total_percent_out at 100% (no holder can own more than 100% of a company)
+        total_percent_out = float(holder['total_percent_out'])
+        if total_percent_out > 100:
+            print(f"   ⚠ Capping total_percent_out for {holder['holder_name']}: {total_percent_out}% -> 100%")
+            total_percent_out = 100
+        
+        holder_rows.append({
+            'holder_name': holder['holder_name'],
+            'ticker': holder['ticker'],
+            'total_position': holder['total_position'],
+            'total_percent_out': round(total_percent_out, 2),
+            'latest_change': holder['latest_change'],
+            'institution_type': holder.get('institution_type'),
+            'country': holder.get('country'),
+            'metro_area': holder.get('metro_area'),
+            'insider_status': holder.get('insider_status'),
+            'tree_level': holder.get('tree_level', 0)
+        })
     
-    # Insert portfolios
-    print(f"\n3. Inserting portfolios...")
-    inserted_count = 0
-    error_count = 0
+    return holder_rows
+
+def prepare_portfolio_rows(portfolios, ticker):
+    """
+    Shape transformed portfolios into rows keyed by holder_name for linking
+    Returns (portfolio_rows, missing_holder_count, error_count)
+    """
+    portfolio_rows = []
     missing_holder_count = 0
+    error_count = 0
     
     for portfolio in portfolios:
         try:
-            # Find holder_id by name matching (don't use holder_id from transform script - it's a temp index)
-            holder_name = portfolio.get('holder_name', '')
-            holder_id = None
+            # Holder linking happens later (server-side in insert_portfolios_bulk, or resolve_holder_id for COPY)
+            # (don't use holder_id from transform script - it's a temp index)
+            holder_name = portfolio.get('holder_name') or ''
             
-            if holder_name:
-                # First try exact match
-                if holder_name in holder_id_map:
-                    holder_id = holder_id_map[holder_name]
-                else:
-                    # Try to find by partial matching (holder name might be a substring or vice versa)
-                    for h_name, h_id in holder_id_map.items():
-                        if holder_name in h_name or h_name in holder_name:
-                            holder_id = h_id
-                            break
-            
-            if not holder_id:
+            if not holder_name:
                 missing_holder_count += 1
                 if missing_holder_count <= 10:  # Only print first 10 to avoid spam
-                    print(f"   ⚠ Could not find holder for portfolio: {portfolio.get('portfolio_name', 'unknown')} (holder: {holder_name})")
+                    print(f"   ⚠ Missing holder name for portfolio: {portfolio.get('portfolio_name', 'unknown')}")
                 elif missing_holder_count == 11:
                     print(f"   ⚠ ... (suppressing further missing holder warnings)")
                 error_count += 1
@@ -144,7 +131,8 @@ def migrate_ownership_data(json_path='../data/ownership_transformed.json'):
                 tree_level = 0
             
             portfolio_data = {
-                'holder_id': holder_id,
+                'holder_name': holder_name,
+                'ticker': portfolio.get('ticker', ticker),
                 'portfolio_name': portfolio['portfolio_name'],
                 'position': int(portfolio.get('position', 0)),
                 'percent_out': round(percent_out, 2),
@@ -152,26 +140,206 @@ def migrate_ownership_data(json_path='../data/ownership_transformed.json'):
                 'latest_change': int(portfolio.get('latest_change', 0)),
                 'filing_date': portfolio.get('filing_date'),
                 'source': portfolio.get('source'),
-                'tree_level': int(tree_level),
-                'parent_holder_id': None  # Don't use parent_holder_id from transform - it's a temp index
+                'tree_level': int(tree_level)
             }
             
-            result = supabase.table('ownership_portfolios').insert(portfolio_data).execute()
-            inserted_count += 1
-            
-            if inserted_count % 100 == 0:
-                print(f"   Processed {inserted_count} portfolios...")
+            portfolio_rows.append(portfolio_data)
         except Exception as e:
             error_count += 1
             if error_count <= 10:  # Only print first 10 errors to avoid spam
-                print(f"   ✗ Error inserting portfolio {portfolio.get('portfolio_name', 'unknown')}: {str(e)}")
+                print(f"   ✗ Error preparing portfolio {portfolio.get('portfolio_name', 'unknown')}: {str(e)}")
             elif error_count == 11:
                 print(f"   ✗ ... (suppressing further error messages)")
     
+    return portfolio_rows, missing_holder_count, error_count
+
+def normalize_holder_name(holder_name):
+    """Case-insensitive matching key (mirrors lower(btrim(...)) in insert_portfolios_bulk)"""
+    return holder_name.lower().strip()
+
+def resolve_holder_id(holder_name, holder_id_map, normalized_id_map):
+    """
+    Find a holder id by exact name, then case-insensitive name, then by substring
+    match either way (same rules as insert_portfolios_bulk and the transform script)
+    """
+    if holder_name in holder_id_map:
+        return holder_id_map[holder_name]
+    holder_id = normalized_id_map.get(normalize_holder_name(holder_name))
+    if holder_id is not None:
+        return holder_id
+    for h_name, h_id in holder_id_map.items():
+        if holder_name in h_name or h_name in holder_name:
+            return h_id
+    return None
+
+def migrate_ownership_data(data=None, json_path=None, bulk=False, atomic=False):
+    """
+    Migrate ownership data to Supabase
+    Uses `data` (the dict returned by transform_ownership_data) when given,
+    otherwise loads it from json_path
+    With bulk=True, loads over a direct Postgres connection using COPY
+    With atomic=True, sends everything in one migrate_ownership RPC (one transaction)
+    """
+    if bulk:
+        return migrate_ownership_data_copy(data, json_path)
+    if atomic:
+        return asyncio.run(migrate_ownership_data_atomic(data, json_path))
+    return asyncio.run(migrate_ownership_data_async(data, json_path))
+
+async def create_supabase_client():
+    """
+    Create the async Supabase client from environment variables, with a pooled HTTP client
+    Returns None (after printing why) when credentials are missing
+    """
+    # Initialize Supabase client
+    # Use service role key for migrations to bypass RLS
+    supabase_url = os.getenv('NEXT_PUBLIC_SUPABASE_URL')
+    supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('NEXT_PUBLIC_SUPABASE_ANON_KEY')
+    
+    if not supabase_url or not supabase_key:
+        print("ERROR: Supabase credentials not found in environment variables")
+        print("Please set NEXT_PUBLIC_SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY (or NEXT_PUBLIC_SUPABASE_ANON_KEY)")
+        return None
+    
+    if 'SERVICE_ROLE' in supabase_key or len(supabase_key) > 100:
+        print("Using service role key (bypasses RLS)")
+    else:
+        print("WARNING: Using anon key - RLS policies may block inserts")
+    
+    # Passed through the client options so it survives AsyncClient recreating its PostgREST client
+    options = AsyncClientOptions(httpx_client=create_http_client())
+    supabase: AsyncClient = await acreate_client(supabase_url, supabase_key, options=options)
+    return supabase
+
+def create_http_client():
+    """
+    Build the HTTP client shared by the Supabase sub-clients
+    Over HTTP/2 the concurrent batches are multiplexed as streams on a single
+    connection to the project; the limits only matter if the server falls back to HTTP/1.1
+    """
+    return httpx.AsyncClient(
+        http2=True,
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS),
+        timeout=HTTP_TIMEOUT_S,
+    )
+
+class BatchWriter:
+    """
+    Buffer rows and hand them to `send` in large batches
+    Flushes when the buffer reaches max_rows or its oldest row is max_wait_s old;
+    flushed batches run concurrently (capped at max_concurrency) and are awaited by close()
+    """
+    
+    def __init__(self, send, max_rows=BATCH_SIZE, max_wait_s=1.0, max_concurrency=MAX_CONCURRENT_BATCHES):
+        self.send = send
+        self.max_rows = max_rows
+        self.max_wait_s = max_wait_s
+        self.buf = []
+        self.buf_started_at = None
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.tasks = []
+    
+    def add(self, row):
+        if not self.buf:
+            self.buf_started_at = time.monotonic()
+        self.buf.append(row)
+        if len(self.buf) >= self.max_rows or time.monotonic() - self.buf_started_at >= self.max_wait_s:
+            self.flush()
+    
+    def flush(self):
+        if not self.buf:
+            return
+        batch, self.buf = self.buf, []
+        self.tasks.append(asyncio.create_task(self._send(batch)))
+    
+    async def _send(self, batch):
+        async with self.semaphore:
+            return await self.send(batch)
+    
+    async def close(self):
+        """Flush what's left and return the results of every send, in flush order"""
+        self.flush()
+        return await asyncio.gather(*self.tasks)
+
+async def insert_portfolio_batch(supabase, batch):
+    """
+    Insert one portfolio batch with a single insert_portfolios_bulk RPC call,
+    which joins rows to ownership_holders by name inside Postgres
+    Returns (inserted_count, unmatched_count, failed_count)
+    """
+    try:
+        result = await supabase.rpc('insert_portfolios_bulk', {'payload': batch}).execute()
+        inserted = int(result.data or 0)
+        return inserted, len(batch) - inserted, 0
+    except Exception as e:
+        tqdm.write(f"   ✗ Error inserting batch of {len(batch)} portfolios: {str(e)}")
+        return 0, 0, len(batch)
+
+async def migrate_ownership_data_async(data=None, json_path=None):
+    """
+    Async implementation of the migration: holders are upserted first
+    (insert_portfolios_bulk links portfolios to holders already in the table),
+    then portfolio batches are pipelined
+    """
+    print("=" * 80)
+    print("MIGRATING OWNERSHIP DATA TO SUPABASE")
+    print("=" * 80)
+    
+    supabase = await create_supabase_client()
+    if supabase is None:
+        return
+    
+    data = load_transformed_data(data, json_path)
+    holders = data['holders']
+    portfolios = data['portfolios']
+    
+    print(f"   Found {len(holders)} holders and {len(portfolios)} portfolios")
+    
+    # Insert holders
+    print("\n2. Inserting holders...")
+    ticker = data.get('ticker', 'WBD')
+    
+    holder_rows = prepare_holder_rows(holders)
+    
+    # Upsert in batches: one round-trip per chunk handles insert-or-update
+    # (returning='minimal' - no ids are needed here, portfolios are linked server-side)
+    # Progress goes to a tqdm bar; tqdm.write keeps error lines from breaking it
+    upserted_count = 0
+    with tqdm(total=len(holder_rows), desc='   Holders', unit='row') as pbar:
+        for chunk in chunked(holder_rows):
+            try:
+                await supabase.table('ownership_holders').upsert(chunk, on_conflict='holder_name,ticker', returning='minimal').execute()
+                upserted_count += len(chunk)
+            except Exception as e:
+                tqdm.write(f"   ✗ Error upserting {len(chunk)} holders: {str(e)}")
+            pbar.update(len(chunk))
+    
+    # Insert portfolios
+    print(f"\n3. Inserting portfolios...")
+    portfolio_rows, missing_holder_count, error_count = prepare_portfolio_rows(portfolios, ticker)
+    
+    # Buffer prepared portfolios into concurrent batches instead of one request per row
+    with tqdm(total=len(portfolio_rows), desc='   Portfolios', unit='row') as pbar:
+        async def send(batch):
+            result = await insert_portfolio_batch(supabase, batch)
+            pbar.update(len(batch))
+            return result
+        
+        writer = BatchWriter(send)
+        for row in portfolio_rows:
+            writer.add(row)
+        results = await writer.close()
+    inserted_count, unmatched_count, failed_count = (sum(r[i] for r in results) for i in range(3))
+    if unmatched_count:
+        print(f"   ⚠ {unmatched_count} portfolios had no matching holder and were skipped")
+    missing_holder_count += unmatched_count
+    error_count += unmatched_count + failed_count
+    
     print("\n" + "=" * 80)
     print("MIGRATION COMPLETE")
     print("=" * 80)
-    print(f"Holders inserted/updated: {len(holder_id_map)}")
+    print(f"Holders inserted/updated: {upserted_count}")
     print(f"Portfolios inserted: {inserted_count}")
     print(f"Portfolios with missing holders: {missing_holder_count}")
     print(f"Other portfolio errors: {error_count - missing_holder_count}")
@@ -180,12 +348,194 @@ def migrate_ownership_data(json_path='../data/ownership_transformed.json'):
     # Refresh materialized view
     print("\n4. Refreshing materialized view...")
     try:
-        supabase.rpc('refresh_ownership_summary').execute()
+        await supabase.rpc('refresh_ownership_summary').execute()
         print("   ✓ Materialized view refreshed")
     except Exception as e:
         print(f"   ⚠ Could not refresh materialized view: {str(e)}")
         print("   (You can refresh it manually in Supabase SQL Editor)")
+    
+    await supabase.postgrest.aclose()
 
-if __name__ == '__main__':
-    migrate_ownership_data()
+def migrate_ownership_data_copy(data=None, json_path=None):
+    """
+    Bulk-load ownership data with COPY over a direct Postgres connection
+    Much faster than the REST path for a cold load; needs SUPABASE_DB_URL
+    (Supabase Dashboard → Project Settings → Database → Connection string)
+    """
+    print("=" * 80)
+    print("MIGRATING OWNERSHIP DATA TO SUPABASE (COPY)")
+    print("=" * 80)
+    
+    db_url = os.getenv('SUPABASE_DB_URL')
+    if not db_url:
+        print("ERROR: SUPABASE_DB_URL not found in environment variables")
+        print("Please set SUPABASE_DB_URL to the Postgres connection string to use --bulk")
+        return
+    
+    try:
+        import psycopg
+    except ImportError:
+        print("ERROR: psycopg is required for --bulk")
+        print("Install it with: pip install 'psycopg[binary]'")
+        return
+    
+    data = load_transformed_data(data, json_path)
+    holders = data['holders']
+    portfolios = data['portfolios']
+    ticker = data.get('ticker', 'WBD')
+    
+    print(f"   Found {len(holders)} holders and {len(portfolios)} portfolios")
+    
+    holder_rows = prepare_holder_rows(holders)
+    portfolio_rows, missing_holder_count, error_count = prepare_portfolio_rows(portfolios, ticker)
+    
+    holder_columns = ', '.join(HOLDER_COLUMNS)
+    holder_updates = ', '.join(f"{col} = EXCLUDED.{col}" for col in HOLDER_COLUMNS[2:])
+    portfolio_columns = ', '.join(PORTFOLIO_COLUMNS)
+    
+    with psycopg.connect(db_url) as conn:
+        with conn.cursor() as cur:
+            # COPY can't resolve conflicts, so stage holders and upsert from the staging table
+            print("\n2. Copying holders...")
+            cur.execute("""
+                CREATE TEMP TABLE ownership_holders_staging (
+                  holder_name TEXT,
+                  ticker TEXT,
+                  total_position BIGINT,
+                  total_percent_out NUMERIC(5, 2),
+                  latest_change BIGINT,
+                  institution_type TEXT,
+                  country TEXT,
+                  metro_area TEXT,
+                  insider_status TEXT,
+                  tree_level INTEGER
+                ) ON COMMIT DROP
+            """)
+            with cur.copy(f"COPY ownership_holders_staging ({holder_columns}) FROM STDIN") as copy:
+                for row in holder_rows:
+                    copy.write_row(tuple(row[col] for col in HOLDER_COLUMNS))
+            cur.execute(f"""
+                INSERT INTO public.ownership_holders ({holder_columns})
+                SELECT {holder_columns} FROM ownership_holders_staging
+                ON CONFLICT (holder_name, ticker) DO UPDATE SET {holder_updates}
+            """)
+            upserted_count = cur.rowcount
+            conn.commit()
+            print(f"   ✓ Upserted {upserted_count} holders")
+            
+            # One query for the whole id map (ordered so substring ties match insert_portfolios_bulk)
+            cur.execute("SELECT holder_name, id FROM public.ownership_holders WHERE ticker = %s ORDER BY id", (ticker,))
+            holder_id_map = dict(cur.fetchall())
+            normalized_id_map = {}
+            for h_name, h_id in holder_id_map.items():
+                normalized_id_map.setdefault(normalize_holder_name(h_name), h_id)
+            
+            print("\n3. Copying portfolios...")
+            resolved_ids = {}
+            copy_rows = []
+            for row in portfolio_rows:
+                holder_name = row['holder_name']
+                if holder_name not in resolved_ids:
+                    resolved_ids[holder_name] = resolve_holder_id(holder_name, holder_id_map, normalized_id_map)
+                holder_id = resolved_ids[holder_name]
+                if holder_id is None:
+                    missing_holder_count += 1
+                    error_count += 1
+                    continue
+                copy_rows.append({**row, 'holder_id': holder_id})
+            
+            with cur.copy(f"COPY public.ownership_portfolios ({portfolio_columns}) FROM STDIN") as copy:
+                for row in copy_rows:
+                    copy.write_row(tuple(row[col] for col in PORTFOLIO_COLUMNS))
+            conn.commit()
+            inserted_count = len(copy_rows)
+            print(f"   ✓ Copied {inserted_count} portfolios")
+            
+            print("\n" + "=" * 80)
+            print("MIGRATION COMPLETE")
+            print("=" * 80)
+            print(f"Holders inserted/updated: {upserted_count}")
+            print(f"Portfolios inserted: {inserted_count}")
+            print(f"Portfolios with missing holders: {missing_holder_count}")
+            print(f"Other portfolio errors: {error_count - missing_holder_count}")
+            print(f"Total portfolio errors: {error_count}")
+            
+            # Refresh materialized view
+            print("\n4. Refreshing materialized view...")
+            try:
+                cur.execute("SELECT refresh_ownership_summary()")
+                conn.commit()
+                print("   ✓ Materialized view refreshed")
+            except Exception as e:
+                conn.rollback()
+                print(f"   ⚠ Could not refresh materialized view: {str(e)}")
+                print("   (You can refresh it manually in Supabase SQL Editor)")
 
+async def migrate_ownership_data_atomic(data=None, json_path=None):
+    """
+    Send all holders and portfolios in a single migrate_ownership RPC call
+    One HTTP request and one commit; a failure rolls the whole migration back
+    """
+    print("=" * 80)
+    print("MIGRATING OWNERSHIP DATA TO SUPABASE (SINGLE TRANSACTION)")
+    print("=" * 80)
+    
+    supabase = await create_supabase_client()
+    if supabase is None:
+        return
+    
+    data = load_transformed_data(data, json_path)
+    holders = data['holders']
+    portfolios = data['portfolios']
+    ticker = data.get('ticker', 'WBD')
+    
+    print(f"   Found {len(holders)} holders and {len(portfolios)} portfolios")
+    
+    holder_rows = prepare_holder_rows(holders)
+    portfolio_rows, missing_holder_count, error_count = prepare_portfolio_rows(portfolios, ticker)
+    
+    print("\n2. Migrating holders and portfolios in one transaction...")
+    try:
+        result = await supabase.rpc('migrate_ownership', {'holders': holder_rows, 'portfolios': portfolio_rows}).execute()
+    except Exception as e:
+        print(f"   ✗ Migration failed and was rolled back: {str(e)}")
+        await supabase.postgrest.aclose()
+        return
+    
+    counts = result.data or {}
+    upserted_count = counts.get('holders', 0)
+    inserted_count = counts.get('portfolios', 0)
+    unmatched_count = counts.get('unmatched_portfolios', 0)
+    if unmatched_count:
+        print(f"   ⚠ {unmatched_count} portfolios had no matching holder and were skipped")
+    missing_holder_count += unmatched_count
+    error_count += unmatched_count
+    
+    print("\n" + "=" * 80)
+    print("MIGRATION COMPLETE")
+    print("=" * 80)
+    print(f"Holders inserted/updated: {upserted_count}")
+    print(f"Portfolios inserted: {inserted_count}")
+    print(f"Portfolios with missing holders: {missing_holder_count}")
+    print(f"Other portfolio errors: {error_count - missing_holder_count}")
+    print(f"Total portfolio errors: {error_count}")
+    
+    # Refresh materialized view
+    print("\n3. Refreshing materialized view...")
+    try:
+        await supabase.rpc('refresh_ownership_summary').execute()
+        print("   ✓ Materialized view refreshed")
+    except Exception as e:
+        print(f"   ⚠ Could not refresh materialized view: {str(e)}")
+        print("   (You can refresh it manually in Supabase SQL Editor)")
+    
+    await supabase.postgrest.aclose()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Migrate transformed ownership data to Supabase')
+    parser.add_argument('--json-path', default=DEFAULT_JSON_PATH, help='Path to the transformed JSON file')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--bulk', action='store_true', help='Load with Postgres COPY via SUPABASE_DB_URL instead of the REST API')
+    mode.add_argument('--atomic', action='store_true', help='Send everything in one migrate_ownership RPC (single transaction)')
+    args = parser.parse_args()
+    migrate_ownership_data(json_path=args.json_path, bulk=args.bulk, atomic=args.atomic)
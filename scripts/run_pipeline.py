@@ -0,0 +1,17 @@
+"""
+Transform Ownership_Map.csv and migrate it to Supabase in one run
+Passes the transformed data in memory, skipping the intermediate JSON file
+"""
+
+import argparse
+
+from transform_ownership_data import transform_ownership_data
+from migrate_ownership_to_supabase import migrate_ownership_data
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Transform and migrate ownership data to Supabase')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--bulk', action='store_true', help='Load with Postgres COPY via SUPABASE_DB_URL instead of the REST API')
+    mode.add_argument('--atomic', action='store_true', help='Send everything in one migrate_ownership RPC (single transaction)')
+    args = parser.parse_args()
+    migrate_ownership_data(data=transform_ownership_data(output_path=None), bulk=args.bulk, atomic=args.atomic)
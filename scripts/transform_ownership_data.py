@@ -6,72 +6,62 @@ This script processes the hierarchical ownership data and prepares it for databa
 import pandas as pd
 import numpy as np
 from datetime import datetime
-import json
+import orjson
 import re
 
-def clean_numeric(value, is_percentage=False):
+def clean_numeric_series(series, is_percentage=False):
     """
-    Convert number format to standard numeric
+    Convert a column of number strings to standard numeric
     Handles both US format (1,234.56) and European format (1.234,56)
     For percentages, caps at 100% (no holder can own more than 100% of a company)
+    Format detection runs as vectorized string ops over the whole column
     """
-    if pd.isna(value) or value == '' or value == '-':
-        return 0
+    s = series.astype('string').str.strip().str.replace('%', '', regex=False).str.strip()
     
-    value_str = str(value).strip()
-    # Remove percentage signs
-    value_str = value_str.replace('%', '').strip()
+    has_comma = s.str.contains(',', regex=False, na=False).to_numpy(dtype=bool)
+    has_dot = s.str.contains('.', regex=False, na=False).to_numpy(dtype=bool)
+    last_comma = s.str.rfind(',')
+    last_dot = s.str.rfind('.')
     
-    # Detect format:
-    # European: 1.234,56 (. for thousands, , for decimal)
-    # US: 1,234.56 (. for decimal, , for thousands)
-    has_comma = ',' in value_str
-    has_dot = '.' in value_str
+    # Both present - whichever comes last is the decimal separator
+    european = has_comma & has_dot & (last_comma > last_dot).fillna(False).to_numpy(dtype=bool)
+    us = has_comma & has_dot & ~european
+    # Only comma - a single comma followed by 1-2 digits is a decimal separator (e.g., "6,39" = 6.39)
+    comma_decimal = (
+        has_comma & ~has_dot
+        & (s.str.count(',') == 1).fillna(False).to_numpy(dtype=bool)
+        & ((s.str.len() - last_comma - 1) <= 2).fillna(False).to_numpy(dtype=bool)
+    )
+    comma_thousands = has_comma & ~has_dot & ~comma_decimal
     
-    if has_comma and has_dot:
-        # Both present - check which comes last (that's the decimal separator)
-        last_comma = value_str.rfind(',')
-        last_dot = value_str.rfind('.')
-        
-        if last_comma > last_dot:
-            # European format: 1.234,56
-            value_str = value_str.replace('.', '').replace(',', '.')
-        else:
-            # US format: 1,234.56
-            value_str = value_str.replace(',', '')
-    elif has_comma and not has_dot:
-        # Only comma - check if it's a decimal separator
-        # If there are 1-2 digits after comma, treat as decimal (e.g., "6,39" = 6.39)
-        parts = value_str.split(',')
-        if len(parts) == 2 and len(parts[1]) <= 2:
-            # European decimal: 6,39 -> 6.39
-            value_str = value_str.replace(',', '.')
-        else:
-            # US thousands separator: 1,234 -> 1234
-            value_str = value_str.replace(',', '')
-    # If only dot, it's already in standard format
+    cleaned = np.select(
+        [european, us | comma_thousands, comma_decimal],
+        [
+            s.str.replace('.', '', regex=False).str.replace(',', '.', regex=False),
+            s.str.replace(',', '', regex=False),
+            s.str.replace(',', '.', regex=False),
+        ],
+        default=s,
+    )
     
-    try:
-        parsed = float(value_str)
-        # For percentages, cap at 100% (no holder can own more than 100% of a company)
-        if is_percentage:
-            parsed = min(max(0, parsed), 100)
-        return parsed
-    except:
-        return 0
+    parsed = pd.to_numeric(pd.Series(cleaned, index=series.index), errors='coerce').fillna(0)
+    # For percentages, cap at 100% (no holder can own more than 100% of a company)
+    if is_percentage:
+        parsed = parsed.clip(0, 100)
+    return parsed.astype('float64')
 
-def parse_date(date_str):
-    """Parse date from DD.MM.YYYY format"""
-    if pd.isna(date_str) or date_str == '':
-        return None
-    try:
-        return pd.to_datetime(date_str, format='%d.%m.%Y')
-    except:
-        return None
+def find_parent_holder(holder_name, holder_name_to_id):
+    """Return the id of the first holder whose name contains, or is contained in, holder_name"""
+    for h_name, h_id in holder_name_to_id.items():
+        # Check if holder_name contains h_name or vice versa (for hierarchical matching)
+        if h_name in holder_name or holder_name in h_name:
+            return h_id
+    return None
 
 def transform_ownership_data(csv_path='../data/Ownership_Map.csv', output_path='../data/ownership_transformed.json'):
     """
     Transform the ownership CSV data into a format suitable for Supabase insertion
+    Pass output_path=None to skip writing JSON (e.g. when piping into the migrator)
     """
     print("=" * 80)
     print("TRANSFORMING OWNERSHIP DATA FOR SUPABASE")
@@ -79,29 +69,42 @@ def transform_ownership_data(csv_path='../data/Ownership_Map.csv', output_path='
     
     # Read the CSV with semicolon separator
     print("\n1. Reading CSV file...")
-    df_raw = pd.read_csv(csv_path, sep=';', skiprows=12, encoding='utf-8')
+    # Declare the formatted number columns as strings up front (clean_numeric_series parses them)
+    # and keep Arrow-backed columns so the string ops downstream run on Arrow kernels.
+    # The C parser is kept: the pyarrow engine ignores skiprows here and renames the blank headers
+    df_raw = pd.read_csv(
+        csv_path,
+        sep=';',
+        skiprows=12,
+        encoding='utf-8',
+        dtype={'Position': 'string', 'Latest Chg': 'string', '% Out': 'string', '% Portfolio': 'string', 'Tree Level': 'string'},
+        dtype_backend='pyarrow',
+    )
     
     # Clean column names
     df_raw.columns = df_raw.columns.str.strip()
     
-    # Remove empty rows and separator rows
-    df = df_raw.dropna(how='all')
-    df = df[~df.iloc[:, 0].astype(str).str.contains('^;+$', regex=True, na=False)]
+    # Remove empty rows and separator rows (all semicolons) in a single filtering pass
+    empty_rows = df_raw.isna().all(axis=1)
+    separator_rows = df_raw.iloc[:, 0].astype('string').str.fullmatch(';+', na=False)
+    df = df_raw[~(empty_rows | separator_rows)]
     
     # Extract ticker from header (if available)
     ticker = 'WBD'  # Default to WBD for Warner Bros Discovery
     
     # Fix Holder Name: when it's "-", the actual name is in "Unnamed: 2"
     if 'Holder Name' in df.columns and 'Unnamed: 2' in df.columns:
-        def extract_holder_name(row):
-            holder_name = str(row.get('Holder Name', '')).strip()
-            if holder_name in ['-', 'nan', '', '--']:
-                # Try to get from Unnamed: 2
-                alt_name = str(row.get('Unnamed: 2', '')).strip()
-                if alt_name and alt_name not in ['nan', '', '--', '-']:
-                    return alt_name
-            return holder_name if holder_name not in ['-', 'nan', '', '--'] else None
-        df['Holder Name'] = df.apply(extract_holder_name, axis=1)
+        # Column-wise masks instead of a row-wise apply: fall back to Unnamed: 2 when Holder Name is a placeholder
+        placeholders = ['-', 'nan', '', '--']
+        holder_names = df['Holder Name'].astype('string').str.strip()
+        alt_names = df['Unnamed: 2'].astype('string').str.strip()
+        holder_missing = (holder_names.isin(placeholders) | holder_names.isna()).to_numpy(dtype=bool)
+        alt_missing = (alt_names.isin(placeholders) | alt_names.isna()).to_numpy(dtype=bool)
+        df['Holder Name'] = np.where(
+            holder_missing & ~alt_missing,
+            alt_names,
+            np.where(holder_missing, None, holder_names),
+        )
     
     # Remove rows without valid holder names (but keep portfolio rows for later processing)
     df = df[df['Holder Name'].notna()]
@@ -109,33 +112,32 @@ def transform_ownership_data(csv_path='../data/Ownership_Map.csv', output_path='
     # Transform numeric columns
     print("\n2. Transforming numeric columns...")
     if 'Position' in df.columns:
-        # Convert to numeric values using clean_numeric, then ensure proper type conversion
-        df['Position'] = df['Position'].apply(lambda x: clean_numeric(x, is_percentage=False))
-        # Convert to float64 first (this handles object dtype), fill NaN, then convert to int
-        df['Position'] = pd.Series(df['Position'], dtype='float64').fillna(0).astype('int64').astype('Int64')
+        # Convert the whole column at once, then truncate to integer share counts
+        df['Position'] = clean_numeric_series(df['Position'], is_percentage=False)
+        df['Position'] = df['Position'].astype('int64').astype('Int64')
     
     if 'Latest Chg' in df.columns:
-        # Convert to numeric values using clean_numeric, then ensure proper type conversion
-        df['Latest Chg'] = df['Latest Chg'].apply(lambda x: clean_numeric(x, is_percentage=False))
-        # Convert to float64 first (this handles object dtype), fill NaN, then convert to int
-        df['Latest Chg'] = pd.Series(df['Latest Chg'], dtype='float64').fillna(0).astype('int64').astype('Int64')
+        # Convert the whole column at once, then truncate to integer share counts
+        df['Latest Chg'] = clean_numeric_series(df['Latest Chg'], is_percentage=False)
+        df['Latest Chg'] = df['Latest Chg'].astype('int64').astype('Int64')
     
     # Transform percentage columns (cap at 100%)
     for col in ['% Out', '% Portfolio']:
         if col in df.columns:
-            df[col] = df[col].apply(lambda x: clean_numeric(x, is_percentage=True))
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+            df[col] = clean_numeric_series(df[col], is_percentage=True)
     
     # Transform date
     if 'Filing Date' in df.columns:
-        df['Filing Date'] = df['Filing Date'].apply(parse_date)
+        # Dates are DD.MM.YYYY; anything unparseable becomes NaT (serialized as null)
+        df['Filing Date'] = pd.to_datetime(df['Filing Date'], format='%d.%m.%Y', errors='coerce')
     
     # Clean text columns
     text_cols = ['Portfolio Name', 'Source', 'Insider Status', 'Institution Type', 'Metro Area', 'Country']
     for col in text_cols:
         if col in df.columns:
-            df[col] = df[col].astype(str).str.strip()
-            df[col] = df[col].replace(['nan', 'N/A', '--', '-'], None)
+            # 'string' dtype keeps missing values as NA (astype(str) would turn them into 'nan'/'<NA>')
+            df[col] = df[col].astype('string').str.strip()
+            df[col] = df[col].mask(df[col].isin(['nan', 'N/A', '--', '-']))
     
     # Transform Tree Level
     if 'Tree Level' in df.columns:
@@ -152,91 +154,75 @@ def transform_ownership_data(csv_path='../data/Ownership_Map.csv', output_path='
     
     # Aggregate top-level holders
     print("\n4. Aggregating top-level holders...")
-    holders_data = []
-    holder_map = {}  # Map holder name to holder data
+    # Aggregate if same holder appears multiple times
+    # Note: Don't sum percentages - they represent the same ownership, just at different tree levels
+    # Use max percentage instead of summing (percentages shouldn't be summed)
+    holders_df = top_level.groupby('Holder Name', sort=False).agg(
+        total_position=('Position', 'sum'),
+        total_percent_out=('% Out', 'max'),
+        latest_change=('Latest Chg', 'sum'),
+    )
     
-    for idx, row in top_level.iterrows():
-        holder_name = str(row.get('Holder Name', '')).strip()
-        if not holder_name or holder_name in ['-', 'nan', '']:
-            continue
-        
-        position = int(clean_numeric(row.get('Position', 0), is_percentage=False))
-        percent_out = float(clean_numeric(row.get('% Out', 0), is_percentage=True))
-        latest_change = int(clean_numeric(row.get('Latest Chg', 0), is_percentage=False))
-        
-        if holder_name not in holder_map:
-            holder_data = {
-                'holder_name': holder_name,
-                'ticker': ticker,
-                'total_position': position,
-                'total_percent_out': percent_out,
-                'latest_change': latest_change,
-                'institution_type': row.get('Institution Type') if pd.notna(row.get('Institution Type')) else None,
-                'country': row.get('Country') if pd.notna(row.get('Country')) else None,
-                'metro_area': row.get('Metro Area') if pd.notna(row.get('Metro Area')) else None,
-                'insider_status': row.get('Insider Status') if pd.notna(row.get('Insider Status')) else None,
-                'tree_level': int(row.get('Tree Level', 0) or 0),
-                'filing_date': row.get('Filing Date').strftime('%Y-%m-%d') if pd.notna(row.get('Filing Date')) else None
-            }
-            holder_map[holder_name] = holder_data
-            holders_data.append(holder_data)
-        else:
-            # Aggregate if same holder appears multiple times
-            # Note: Don't sum percentages - they represent the same ownership, just at different tree levels
-            # Take the maximum percentage instead, or recalculate from total position
-            holder_map[holder_name]['total_position'] += position
-            # Use max percentage instead of summing (percentages shouldn't be summed)
-            holder_map[holder_name]['total_percent_out'] = max(holder_map[holder_name]['total_percent_out'], percent_out)
-            holder_map[holder_name]['latest_change'] += latest_change
+    # Descriptive fields come from the first row seen for each holder
+    first_rows = top_level.drop_duplicates('Holder Name').set_index('Holder Name')
+    holders_df = holders_df.join(first_rows[['Institution Type', 'Country', 'Metro Area', 'Insider Status', 'Tree Level', 'Filing Date']])
+    holders_df = holders_df.reset_index().rename(columns={
+        'Holder Name': 'holder_name',
+        'Institution Type': 'institution_type',
+        'Country': 'country',
+        'Metro Area': 'metro_area',
+        'Insider Status': 'insider_status',
+        'Tree Level': 'tree_level',
+        'Filing Date': 'filing_date',
+    })
+    holders_df.insert(1, 'ticker', ticker)
+    holders_df['filing_date'] = holders_df['filing_date'].dt.strftime('%Y-%m-%d')
+    holders_df = holders_df.astype(object).where(holders_df.notna(), None)
+    holders_data = holders_df.to_dict(orient='records')
     
     # Process portfolios
     print("\n5. Processing portfolios...")
-    portfolios_data = []
-    
     # Create a mapping of holder names to their data for portfolio linking
     holder_name_to_id = {h['holder_name']: idx + 1 for idx, h in enumerate(holders_data)}
+    # Case-insensitive keys for O(1) lookups before the substring scan (first holder wins on collisions)
+    normalized_name_to_id = {}
+    for h_name, h_id in holder_name_to_id.items():
+        normalized_name_to_id.setdefault(h_name.lower().strip(), h_id)
     
-    # Build a hierarchy map: for each row, find its parent holder by looking up the tree
-    # We'll match portfolios to holders by finding the closest parent holder name
-    for idx, row in portfolio_level.iterrows():
-        portfolio_name = str(row.get('Portfolio Name', '')).strip()
-        holder_name = str(row.get('Holder Name', '')).strip()
-        
-        if not portfolio_name or portfolio_name in ['-', 'nan', '', '--']:
-            continue
-        
-        # Find parent holder: look for holder names that contain or are contained in the current holder name
-        parent_holder_id = None
-        if holder_name:
-            # First try exact match
-            if holder_name in holder_name_to_id:
-                parent_holder_id = holder_name_to_id[holder_name]
-            else:
-                # Try to find parent by name matching (holder name might be a substring)
-                for h_name, h_id in holder_name_to_id.items():
-                    # Check if holder_name contains h_name or vice versa (for hierarchical matching)
-                    if h_name in holder_name or holder_name in h_name:
-                        parent_holder_id = h_id
-                        break
-        
-        position = int(clean_numeric(row.get('Position', 0), is_percentage=False))
-        percent_out = float(clean_numeric(row.get('% Out', 0), is_percentage=True))
-        percent_portfolio = float(clean_numeric(row.get('% Portfolio', 0), is_percentage=True)) if pd.notna(row.get('% Portfolio')) else None
-        latest_change = int(clean_numeric(row.get('Latest Chg', 0), is_percentage=False))
-        
-        portfolio_data = {
-            'holder_id': parent_holder_id,  # Will be used to link to holder
-            'holder_name': holder_name,  # Keep for reference
-            'ticker': ticker,
-            'portfolio_name': portfolio_name,
-            'position': position,
-            'percent_out': percent_out,
-            'percent_portfolio': percent_portfolio,
-            'latest_change': latest_change,
-            'filing_date': row.get('Filing Date').strftime('%Y-%m-%d') if pd.notna(row.get('Filing Date')) else None,
-            'source': row.get('Source') if pd.notna(row.get('Source')) else None
-        }
-        portfolios_data.append(portfolio_data)
+    pf = portfolio_level.rename(columns={
+        'Holder Name': 'holder_name',
+        'Portfolio Name': 'portfolio_name',
+        'Position': 'position',
+        '% Out': 'percent_out',
+        '% Portfolio': 'percent_portfolio',
+        'Latest Chg': 'latest_change',
+        'Filing Date': 'filing_date',
+        'Source': 'source',
+    })
+    pf = pf[~pf['portfolio_name'].astype('string').str.strip().isin(['-', 'nan', '', '--']) & pf['portfolio_name'].notna()]
+    
+    # Find parent holder: exact name match via a join, substring match for the rest
+    holders_lookup = pd.DataFrame({'holder_name': list(holder_name_to_id), 'holder_id': list(holder_name_to_id.values())})
+    pf = pf.merge(holders_lookup, on='holder_name', how='left')
+    
+    # Fallback runs once per distinct unmatched name, not once per portfolio row:
+    # case-insensitive exact match first, substring scan only for what's left
+    unmatched = pf['holder_id'].isna() & (pf['holder_name'] != '')
+    fallback_ids = {}
+    for name in pf.loc[unmatched, 'holder_name'].unique():
+        holder_id = normalized_name_to_id.get(name.lower().strip())
+        if holder_id is None:
+            holder_id = find_parent_holder(name, holder_name_to_id)
+        fallback_ids[name] = holder_id
+    pf.loc[unmatched, 'holder_id'] = pf.loc[unmatched, 'holder_name'].map(fallback_ids)
+    pf['holder_id'] = pf['holder_id'].astype('Int64')
+    
+    pf['ticker'] = ticker
+    pf['filing_date'] = pf['filing_date'].dt.strftime('%Y-%m-%d')
+    pf = pf[['holder_id', 'holder_name', 'ticker', 'portfolio_name', 'position', 'percent_out',
+             'percent_portfolio', 'latest_change', 'filing_date', 'source']]
+    pf = pf.astype(object).where(pf.notna(), None)
+    portfolios_data = pf.to_dict(orient='records')
     
     # Prepare output structure
     output = {
@@ -254,9 +240,11 @@ def transform_ownership_data(csv_path='../data/Ownership_Map.csv', output_path='
     }
     
     # Save to JSON
-    print(f"\n6. Saving transformed data to {output_path}...")
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(output, f, indent=2, ensure_ascii=False, default=str)
+    if output_path:
+        print(f"\n6. Saving transformed data to {output_path}...")
+        # orjson writes UTF-8 bytes directly and serializes datetime/NumPy scalars natively
+        with open(output_path, 'wb') as f:
+            f.write(orjson.dumps(output, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY))
     
     print("\n" + "=" * 80)
     print("TRANSFORMATION COMPLETE")
@@ -265,11 +253,12 @@ def transform_ownership_data(csv_path='../data/Ownership_Map.csv', output_path='
     print(f"Total portfolios: {len(portfolios_data)}")
     print(f"Total shares: {output['summary']['total_shares']:,}")
     print(f"Total % outstanding: {output['summary']['total_percent_out']:.2f}%")
-    print(f"\nOutput saved to: {output_path}")
-    print("\nNext steps:")
-    print("1. Review the transformed JSON file")
-    print("2. Run the Supabase migration script to insert data")
-    print("3. Or use the Supabase dashboard to import the data")
+    if output_path:
+        print(f"\nOutput saved to: {output_path}")
+        print("\nNext steps:")
+        print("1. Review the transformed JSON file")
+        print("2. Run the Supabase migration script to insert data")
+        print("3. Or use the Supabase dashboard to import the data")
     
     return output
 
@@ -0,0 +1,157 @@
+-- Ownership Migration Functions
+-- Used by scripts/migrate_ownership_to_supabase.py (default and --atomic modes)
+-- Safe to re-run: only CREATE OR REPLACE statements. Run after ownership_schema.sql
+
+-- Bulk insert portfolios from a JSON array, linking each row to its holder server-side
+-- Matching mirrors the transform/migration scripts: exact holder_name first,
+-- then case-insensitive name, then substring either way
+-- Each stage only sees rows the previous stages left unmatched, so the exact match
+-- uses the UNIQUE(holder_name, ticker) index and the substring scan stays small
+CREATE OR REPLACE FUNCTION insert_portfolios_bulk(payload jsonb)
+RETURNS integer AS $$
+DECLARE
+  inserted_count integer;
+BEGIN
+  WITH p AS (
+    SELECT row_number() OVER () AS rn, r.*
+    FROM jsonb_to_recordset(payload) AS r(
+      holder_name text,
+      ticker text,
+      portfolio_name text,
+      position bigint,
+      percent_out numeric,
+      percent_portfolio numeric,
+      latest_change bigint,
+      filing_date date,
+      source text,
+      tree_level integer
+    )
+    WHERE r.holder_name <> ''
+  ),
+  holders AS (
+    SELECT oh.id, oh.ticker, oh.holder_name, lower(btrim(oh.holder_name)) AS name_key
+    FROM public.ownership_holders oh
+    WHERE oh.ticker IN (SELECT DISTINCT ticker FROM p)
+  ),
+  exact_match AS (
+    SELECT p.rn, oh.id AS holder_id
+    FROM p
+    JOIN public.ownership_holders oh
+      ON oh.holder_name = p.holder_name AND oh.ticker = p.ticker
+  ),
+  ci_match AS (
+    SELECT DISTINCT ON (p.rn) p.rn, h.id AS holder_id
+    FROM p
+    JOIN holders h
+      ON h.name_key = lower(btrim(p.holder_name)) AND h.ticker = p.ticker
+    WHERE NOT EXISTS (SELECT 1 FROM exact_match e WHERE e.rn = p.rn)
+    ORDER BY p.rn, h.id
+  ),
+  -- Substring fallback runs once per distinct unmatched name, not once per row
+  unmatched_names AS (
+    SELECT DISTINCT p.ticker, p.holder_name
+    FROM p
+    WHERE NOT EXISTS (SELECT 1 FROM exact_match e WHERE e.rn = p.rn)
+      AND NOT EXISTS (SELECT 1 FROM ci_match c WHERE c.rn = p.rn)
+  ),
+  substring_name_match AS (
+    SELECT u.ticker, u.holder_name, min(h.id) AS holder_id
+    FROM unmatched_names u
+    JOIN holders h
+      ON h.ticker = u.ticker
+     AND (strpos(h.holder_name, u.holder_name) > 0 OR strpos(u.holder_name, h.holder_name) > 0)
+    GROUP BY u.ticker, u.holder_name
+  ),
+  matched AS (
+    SELECT rn, holder_id FROM exact_match
+    UNION ALL
+    SELECT rn, holder_id FROM ci_match
+    UNION ALL
+    SELECT p.rn, s.holder_id
+    FROM p
+    JOIN substring_name_match s
+      ON s.ticker = p.ticker AND s.holder_name = p.holder_name
+    WHERE NOT EXISTS (SELECT 1 FROM exact_match e WHERE e.rn = p.rn)
+      AND NOT EXISTS (SELECT 1 FROM ci_match c WHERE c.rn = p.rn)
+  )
+  INSERT INTO public.ownership_portfolios (
+    holder_id, portfolio_name, position, percent_out, percent_portfolio,
+    latest_change, filing_date, source, tree_level, parent_holder_id
+  )
+  SELECT
+    m.holder_id,
+    p.portfolio_name,
+    COALESCE(p.position, 0),
+    LEAST(COALESCE(p.percent_out, 0), 100),
+    -- LEAST ignores NULLs, so keep a missing percent_portfolio NULL explicitly
+    CASE WHEN p.percent_portfolio IS NULL THEN NULL ELSE LEAST(p.percent_portfolio, 100) END,
+    COALESCE(p.latest_change, 0),
+    p.filing_date,
+    p.source,
+    COALESCE(p.tree_level, 0),
+    NULL
+  FROM p
+  JOIN matched m ON m.rn = p.rn;
+
+  GET DIAGNOSTICS inserted_count = ROW_COUNT;
+  RETURN inserted_count;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Migrate holders and portfolios in one call (one transaction, one commit)
+-- Upserts holders from the JSON array, then links and inserts portfolios via insert_portfolios_bulk
+-- Returns counts so the migration script can report them
+CREATE OR REPLACE FUNCTION migrate_ownership(holders jsonb, portfolios jsonb)
+RETURNS jsonb AS $$
+DECLARE
+  holder_count integer;
+  portfolio_count integer;
+BEGIN
+  INSERT INTO public.ownership_holders (
+    holder_name, ticker, total_position, total_percent_out, latest_change,
+    institution_type, country, metro_area, insider_status, tree_level
+  )
+  SELECT
+    h.holder_name,
+    h.ticker,
+    COALESCE(h.total_position, 0),
+    LEAST(COALESCE(h.total_percent_out, 0), 100),
+    COALESCE(h.latest_change, 0),
+    h.institution_type,
+    h.country,
+    h.metro_area,
+    h.insider_status,
+    COALESCE(h.tree_level, 0)
+  FROM jsonb_to_recordset(holders) AS h(
+    holder_name text,
+    ticker text,
+    total_position bigint,
+    total_percent_out numeric,
+    latest_change bigint,
+    institution_type text,
+    country text,
+    metro_area text,
+    insider_status text,
+    tree_level integer
+  )
+  ON CONFLICT (holder_name, ticker) DO UPDATE SET
+    total_position = EXCLUDED.total_position,
+    total_percent_out = EXCLUDED.total_percent_out,
+    latest_change = EXCLUDED.latest_change,
+    institution_type = EXCLUDED.institution_type,
+    country = EXCLUDED.country,
+    metro_area = EXCLUDED.metro_area,
+    insider_status = EXCLUDED.insider_status,
+    tree_level = EXCLUDED.tree_level;
+
+  GET DIAGNOSTICS holder_count = ROW_COUNT;
+
+  portfolio_count := insert_portfolios_bulk(portfolios);
+
+  RETURN jsonb_build_object(
+    'holders', holder_count,
+    'portfolios', portfolio_count,
+    'unmatched_portfolios', jsonb_array_length(portfolios) - portfolio_count
+  );
+END;
+$$ LANGUAGE plpgsql;
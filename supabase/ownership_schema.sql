@@ -135,4 +135,3 @@ BEGIN
   REFRESH MATERIALIZED VIEW CONCURRENTLY public.ownership_summary;
 END;
 $$ LANGUAGE plpgsql;
-